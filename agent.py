@@ -1,9 +1,19 @@
 """
 Agent and graph setup - FIXED VERSION without document tools
 """
+import os
+import re
+import json
+import asyncio
+import hashlib
+import importlib.metadata
+import logging
 from typing import Annotated, TypedDict, Any
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import trim_messages
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
@@ -11,6 +21,8 @@ import config
 import memory
 import tools  # Assuming tools.all_tools includes document tools, we will remove them below
 
+logger = logging.getLogger(__name__)
+
 
 # ============ State Definition ============
 class ChatState(TypedDict):
@@ -30,11 +42,92 @@ llm = ChatGoogleGenerativeAI(model='gemini-2.5-pro')
 # Remove document-related tools from tools.all_tools if any
 # For example, if your document tools are named 'doc_tool', remove them:
 non_doc_tools = [tool for tool in tools.all_tools if tool.name != "doc_tool"]
-llm_with_tools = llm.bind_tools(non_doc_tools)
+
+TOOL_SPECS_PATH = os.path.join(config.DATA_DIR, "tool_specs.json")
+
+
+def load_tool_specs(tool_list):
+    """Load cached function-calling specs, regenerating them when tools.py or LangChain changes"""
+    with open(tools.__file__, "rb") as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(",".join(tool.name for tool in tool_list).encode())
+    # Built-in tool schemas and the spec conversion come from these libraries
+    for package in ("langchain-core", "langchain-community"):
+        digest.update(f"{package}=={importlib.metadata.version(package)}".encode())
+    key = digest.hexdigest()
+
+    try:
+        with open(TOOL_SPECS_PATH, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["specs"]
+    except (OSError, ValueError):
+        pass
+
+    specs = [convert_to_openai_tool(tool) for tool in tool_list]
+    try:
+        with open(TOOL_SPECS_PATH, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "specs": specs}, f)
+    except OSError as e:
+        print(f"⚠️ Could not cache tool specs: {e}")
+    return specs
+
+
+# bind() with ready-made specs skips bind_tools' schema generation
+llm_with_tools = llm.bind(tools=load_tool_specs(non_doc_tools))
+
+# Acknowledgements long enough to pass the length gate that still never
+# benefit from memory retrieval (compared after stripping punctuation)
+_TRIVIAL = {
+    "great", "hello", "thanks", "thank you", "thanks a lot", "thank you so much",
+    "ok thanks", "okay thanks", "no thanks", "got it", "got it thanks",
+    "sounds good", "makes sense", "perfect", "awesome", "alright",
+    "understood", "will do", "goodbye", "see you", "good night",
+}
+
+
+def _is_trivial(text):
+    """True when a message is too short or too generic to be worth an embedding + Qdrant search"""
+    if not isinstance(text, str):
+        return True
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+    return len(normalized) < config.MIN_MEMORY_QUERY_CHARS or normalized in _TRIVIAL
+
+
+def _trim_history(messages):
+    """
+    Bound the prompt sent to the LLM.
+
+    Earlier turns are cut to the last MAX_HISTORY_MESSAGES messages and
+    MAX_HISTORY_TOKENS tokens, starting on a human message so tool calls
+    stay paired with their results. The current turn (from the latest
+    human message on) is always sent in full.
+    """
+    start = next(
+        (i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)),
+        0
+    )
+    history, current = messages[:start], messages[start:]
+    if history:
+        history = trim_messages(
+            history,
+            max_tokens=config.MAX_HISTORY_MESSAGES,
+            token_counter=len,
+            strategy="last",
+            start_on="human"
+        )
+        history = trim_messages(
+            history,
+            max_tokens=config.MAX_HISTORY_TOKENS,
+            token_counter=count_tokens_approximately,
+            strategy="last",
+            start_on="human"
+        )
+    return history + current
 
 
 # ============ Chat Node (FIXED) ============
-def chat_node(state: ChatState, config: Any = None):
+async def chat_node(state: ChatState, config: Any = None):
     """Main chat node with proper tool handling"""
 
     if config is None:
@@ -46,19 +139,29 @@ def chat_node(state: ChatState, config: Any = None):
     if not messages:
         return {"messages": []}
 
-    # Debug message types
-    print(f"\n📨 Processing {len(messages)} messages")
-    for i, msg in enumerate(messages[-3:]):
-        print(f"  Message {i}: {type(msg).__name__}")
-
     last_message = messages[-1]
     is_user_message = isinstance(last_message, HumanMessage)
 
+    # Start memory retrieval first so it runs while the rest of the turn is prepared
+    memory_task = None
+    if is_user_message and not _is_trivial(last_message.content):
+        memory_task = asyncio.create_task(
+            memory.aretrieve_memory(thread_id, last_message.content, limit=3)
+        )
+
+    # Debug message types (guarded so nothing is formatted unless enabled)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Processing %d messages", len(messages))
+        for i, msg in enumerate(messages[-3:]):
+            logger.debug("  Message %d: %s", i, type(msg).__name__)
+
+    to_store = []
+
     if is_user_message:
         user_message = last_message.content
 
         try:
-            relevant_memories = memory.retrieve_memory(thread_id, user_message, limit=3)
+            relevant_memories = await memory_task if memory_task else []
 
             if relevant_memories:
                 context = "\n".join([f"- {m}" for m in relevant_memories])
@@ -70,22 +173,29 @@ def chat_node(state: ChatState, config: Any = None):
                 enriched_messages = messages
 
         except Exception as e:
-            print(f"⚠️ Memory retrieval skipped: {e}")
+            logger.warning("Memory retrieval skipped: %s", e)
             enriched_messages = messages
 
-        memory.store_memory(thread_id, user_message, "user")
+        to_store.append((user_message, "user"))
 
     else:
         enriched_messages = messages
 
     try:
-        response = llm_with_tools.invoke(enriched_messages)
+        response = await llm_with_tools.ainvoke(_trim_history(enriched_messages))
     except Exception as e:
-        print(f"❌ LLM invocation failed: {e}")
+        logger.error("LLM invocation failed: %s", e)
+        if to_store:
+            memory.store_memory_batch(thread_id, to_store)
         raise
 
+    # chat_node is the only writer of conversation memories; the UI must not
+    # store them again. User and assistant messages are upserted together.
     if hasattr(response, 'content') and response.content:
-        memory.store_memory(thread_id, response.content, "assistant")
+        to_store.append((response.content, "assistant"))
+    if to_store:
+        logger.debug("Storing %d memories for thread %s", len(to_store), thread_id)
+        memory.store_memory_batch(thread_id, to_store)
 
     return {"messages": [response]}
 
@@ -95,6 +205,8 @@ graph = StateGraph(ChatState)
 
 # Add nodes
 graph.add_node("chat_node", chat_node)
+# Under astream, ToolNode awaits all tool calls of one LLM response with
+# asyncio.gather; sync-only tools are offloaded to executor threads by ainvoke
 graph.add_node("tools", ToolNode(non_doc_tools))
 
 # Start with chat
@@ -1,8 +1,9 @@
 import streamlit as st
+import asyncio
 import uuid
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from agent import chatbot
-from memory import get_all_threads, get_conversation_title, store_memory
+from memory import event_loop, get_all_threads, get_conversation_title
 
 # ============ Page Config ============
 st.set_page_config(
@@ -11,13 +12,32 @@ st.set_page_config(
     layout="wide"
 )
 
+# ============ Async Runtime ============
+def iter_async(agen):
+    """Drive an async generator from Streamlit's script thread"""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), event_loop).result()
+        except StopAsyncIteration:
+            break
+
 # ============ Helper Functions ============
 def new_thread_id():
     return str(uuid.uuid4())
 
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_title(thread_id):
+    return get_conversation_title(thread_id)
+
+def history_cache():
+    # thread_id -> message_history list; lists are appended in place, so entries stay current
+    return st.session_state.setdefault('_history_cache', {})
+
 def reset_chat():
+    cached_title.clear()
     st.session_state['thread_id'] = new_thread_id()
     st.session_state['message_history'] = []
+    history_cache()[st.session_state['thread_id']] = st.session_state['message_history']
     st.rerun()
 
 def load_conversation(thread_id):
@@ -31,6 +51,16 @@ def load_conversation(thread_id):
         temp.append({'role': role, 'content': msg.content})
     return temp
 
+def open_conversation(thread_id):
+    """Switch to a thread, reloading from the checkpointer only on first visit"""
+    if thread_id == st.session_state.get('thread_id'):
+        return
+    cache = history_cache()
+    if thread_id not in cache:
+        cache[thread_id] = load_conversation(thread_id)
+    st.session_state['thread_id'] = thread_id
+    st.session_state['message_history'] = cache[thread_id]
+
 # ============ Session Initialization ============
 if "user_id" not in st.session_state:
     st.session_state["user_id"] = "default_user"
@@ -47,6 +77,7 @@ if 'thread_id' not in st.session_state:
 
 if 'message_history' not in st.session_state:
     st.session_state['message_history'] = load_conversation(st.session_state['thread_id'])
+    history_cache()[st.session_state['thread_id']] = st.session_state['message_history']
 
 # ============ Sidebar ============
 with st.sidebar:
@@ -60,10 +91,9 @@ with st.sidebar:
     # Conversations
     st.subheader("💬 My Chats")
     for thread_id in st.session_state["chat_threads"][::-1]:
-        title = get_conversation_title(thread_id)
+        title = cached_title(thread_id)
         if st.button(title, key=f"thread_{thread_id}", use_container_width=True):
-            st.session_state["thread_id"] = thread_id
-            st.session_state["message_history"] = load_conversation(thread_id)
+            open_conversation(thread_id)
             st.rerun()
 
     st.divider()
@@ -98,8 +128,6 @@ if user_input:
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    store_memory(st.session_state["thread_id"], user_input, "user")
-
     # AI Response
     CONFIG = {
         "configurable": {
@@ -116,12 +144,17 @@ if user_input:
     with st.chat_message("assistant"):
         status_box = {"box": None}
 
-        def ai_stream():
-            for msg_chunk, metadata in chatbot.stream(
+        async def graph_stream():
+            async for msg_chunk, metadata in chatbot.astream(
                 {"messages": [HumanMessage(content=user_input)]},
                 config=CONFIG,
                 stream_mode="messages",
             ):
+                yield msg_chunk
+
+        # Streamlit calls must stay on the script thread, so UI updates happen here
+        def ai_stream():
+            for msg_chunk in iter_async(graph_stream()):
                 if isinstance(msg_chunk, ToolMessage):
                     tool_name = getattr(msg_chunk, "name", "tool")
                     if status_box["box"] is None:
@@ -151,4 +184,4 @@ if user_input:
         "role": "assistant",
         "content": ai_message
     })
-    store_memory(st.session_state["thread_id"], ai_message, "assistant")
+    cached_title.clear()
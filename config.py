@@ -13,11 +13,22 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 STOCK_API_KEY = os.getenv("STOCK_API_KEY")
 
+# gRPC (port 6334) keeps one multiplexed HTTP/2 connection open to Qdrant.
+# Set QDRANT_PREFER_GRPC=false if only the REST port (6333) is exposed
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+
 # ================= Settings =================
 COLLECTION_NAME = "langgraph_memory"
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# CPU hosts: load the model's int8-quantized ONNX export instead of FP32.
+# The file must exist in the model repo (e.g. model_quint8_avx2.onnx for AVX2-only CPUs)
+USE_INT8_EMBEDDINGS = os.getenv("USE_INT8_EMBEDDINGS", "false").lower() == "true"
+EMBEDDING_INT8_FILE = os.getenv("EMBEDDING_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx")
 LLM_MODEL = "openai/gpt-4o-mini"
 MAX_TOKENS = 1000
+MIN_MEMORY_QUERY_CHARS = 5  # shorter messages (ok, yes, hi) skip memory retrieval
+MAX_HISTORY_MESSAGES = 10  # earlier-turn messages sent to the LLM
+MAX_HISTORY_TOKENS = 6000  # token budget for those earlier turns
 
 # ================= Database Path =================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
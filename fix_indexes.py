@@ -2,8 +2,9 @@
 Run this script ONCE to fix Qdrant indexes
 python fix_indexes.py
 """
+from concurrent.futures import ThreadPoolExecutor
 from qdrant_client import QdrantClient
-from qdrant_client.models import PayloadSchemaType
+from qdrant_client.models import PayloadSchemaType, KeywordIndexParams
 import config
 
 print("🔧 Fixing Qdrant indexes...")
@@ -14,37 +15,36 @@ qdrant_client = QdrantClient(
     api_key=config.QDRANT_API_KEY
 )
 
-# Fix indexes for 'conversations' collection
-try:
-    print(f"\n📁 Fixing '{config.COLLECTION_NAME}' collection...")
+# thread_id is the tenant key every memory read filters on
+INDEXED_FIELDS = {
+    "thread_id": KeywordIndexParams(type="keyword", is_tenant=True),
+    "role": PayloadSchemaType.KEYWORD,
+}
 
-    # Create thread_id index
-    try:
-        qdrant_client.create_payload_index(
-            collection_name=config.COLLECTION_NAME,
-            field_name="thread_id",
-            field_schema=PayloadSchemaType.KEYWORD
-        )
-        print("  ✅ Created index for 'thread_id'")
-    except Exception as e:
-        if "already exists" in str(e).lower():
-            print("  ℹ️ Index 'thread_id' already exists")
-        else:
-            print(f"  ⚠️ thread_id index error: {e}")
 
-    # Create role index
+def create_index(field_name):
+    """Create a payload index and report the outcome"""
     try:
         qdrant_client.create_payload_index(
             collection_name=config.COLLECTION_NAME,
-            field_name="role",
-            field_schema=PayloadSchemaType.KEYWORD
+            field_name=field_name,
+            field_schema=INDEXED_FIELDS[field_name]
         )
-        print("  ✅ Created index for 'role'")
+        return f"  ✅ Created index for '{field_name}'"
     except Exception as e:
         if "already exists" in str(e).lower():
-            print("  ℹ️ Index 'role' already exists")
-        else:
-            print(f"  ⚠️ role index error: {e}")
+            return f"  ℹ️ Index '{field_name}' already exists"
+        return f"  ⚠️ {field_name} index error: {e}"
+
+
+# Fix indexes for 'conversations' collection
+try:
+    print(f"\n📁 Fixing '{config.COLLECTION_NAME}' collection...")
+
+    # Indexes are independent, so create them concurrently
+    with ThreadPoolExecutor(max_workers=len(INDEXED_FIELDS)) as executor:
+        for message in executor.map(create_index, INDEXED_FIELDS):
+            print(message)
 
 except Exception as e:
     print(f"  ❌ Error with '{config.COLLECTION_NAME}': {e}")
@@ -2,30 +2,116 @@
 Memory storage and retrieval
 """
 import time
-import hashlib
-import sqlite3
+import queue
+import asyncio
+import threading
 import atexit
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct, PayloadSchemaType
-from langchain_huggingface import HuggingFaceEmbeddings
-from langgraph.checkpoint.sqlite import SqliteSaver
+from collections import OrderedDict
+import aiosqlite
+import xxhash
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    VectorParams, Distance, PointStruct, PayloadSchemaType, HnswConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams, QuantizationSearchParams,
+    Filter, FieldCondition, MatchValue, MatchAny, KeywordIndexParams
+)
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 import config
-# Suppress warnings
-import warnings
-warnings.filterwarnings('ignore', category=FutureWarning, module='torch')
 
 
 # ============ Qdrant Setup ============
+# Ping every 30 s even with no call in flight, so the idle channel between
+# turns isn't torn down; drop the connection if a ping goes unanswered for 10 s
+GRPC_OPTIONS = {
+    "grpc.keepalive_time_ms": 30000,
+    "grpc.keepalive_timeout_ms": 10000,
+    "grpc.keepalive_permit_without_calls": 1,
+}
+
 qdrant_client = QdrantClient(
     url=config.QDRANT_URL,
-    api_key=config.QDRANT_API_KEY
+    api_key=config.QDRANT_API_KEY,
+    prefer_grpc=config.QDRANT_PREFER_GRPC,
+    grpc_options=GRPC_OPTIONS
+)
+
+# Used from the graph's event loop so retrieval doesn't tie up a worker thread
+async_qdrant_client = AsyncQdrantClient(
+    url=config.QDRANT_URL,
+    api_key=config.QDRANT_API_KEY,
+    prefer_grpc=config.QDRANT_PREFER_GRPC,
+    grpc_options=GRPC_OPTIONS
+)
+
+# Loaded on first use: the model is only needed once a message is embedded,
+# so app startup and sidebar rendering don't pay for it
+EMBEDDING_MAX_LENGTH = 256  # tokens
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def _register_int8_model():
+    """Register the int8 ONNX export of the embedding model with fastembed"""
+    from fastembed import TextEmbedding
+    from fastembed.common.model_description import ModelSource, PoolingType
+    
+    name = f"{config.EMBEDDING_MODEL}-int8"
+    try:
+        # Same tokenizer, mean pooling and normalisation as the FP32 model
+        TextEmbedding.add_custom_model(
+            model=name,
+            pooling=PoolingType.MEAN,
+            normalization=True,
+            sources=ModelSource(hf=config.EMBEDDING_MODEL),
+            dim=384,
+            model_file=config.EMBEDDING_INT8_FILE
+        )
+    except ValueError:
+        pass  # already registered
+    return name
+
+
+def get_embedding_model():
+    """Return the embedding model, loading it on first call"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                from langchain_community.embeddings import FastEmbedEmbeddings
+                model_name = config.EMBEDDING_MODEL
+                if config.USE_INT8_EMBEDDINGS:
+                    model_name = _register_int8_model()
+                # fastembed runs the same MiniLM model on ONNX Runtime instead of PyTorch
+                # Truncate at the sentence-transformers max_seq_length (256), as the
+                # previous HuggingFace path did, so long texts match stored vectors
+                _embedding_model = FastEmbedEmbeddings(
+                    model_name=model_name,
+                    max_length=EMBEDDING_MAX_LENGTH
+                )
+    return _embedding_model
+
+
+# HNSW graph settings for the memory collection; a larger ef_construct
+# trades slower indexing for better recall on thread-filtered searches
+HNSW_CONFIG = HnswConfigDiff(m=16, ef_construct=128)
+
+# int8 scalar quantization: 4x smaller vectors kept in RAM for scoring
+QUANTIZATION_CONFIG = ScalarQuantization(
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
 )
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name=config.EMBEDDING_MODEL
+# Oversample on the int8 vectors, then rescore the candidates with the originals
+SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
 )
 
 
+# Every read filters on thread_id, so treat it as the tenant key: Qdrant
+# stores each thread's points together and searches only that region
+THREAD_ID_INDEX = KeywordIndexParams(type="keyword", is_tenant=True)
+
+
 # Create collection if needed
 def setup_qdrant():
     """Setup Qdrant collection (run once)"""
@@ -36,19 +122,42 @@ def setup_qdrant():
         if not exists:
             qdrant_client.create_collection(
                 collection_name=config.COLLECTION_NAME,
-                vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+                # Originals live on disk for rescoring; search runs on the int8 copies in RAM
+                vectors_config=VectorParams(size=384, distance=Distance.COSINE, on_disk=True),
+                hnsw_config=HNSW_CONFIG,
+                quantization_config=QUANTIZATION_CONFIG,
+                on_disk_payload=True
             )
             print(f"✅ Created collection: {config.COLLECTION_NAME}")
         
-        # Create index
-        try:
-            qdrant_client.create_payload_index(
+        info = qdrant_client.get_collection(config.COLLECTION_NAME)
+        
+        # Bring older collections up to the current HNSW settings
+        hnsw = info.config.hnsw_config
+        if (hnsw.m, hnsw.ef_construct) != (HNSW_CONFIG.m, HNSW_CONFIG.ef_construct):
+            qdrant_client.update_collection(
                 collection_name=config.COLLECTION_NAME,
-                field_name="thread_id",
-                field_schema=PayloadSchemaType.KEYWORD
+                hnsw_config=HNSW_CONFIG
             )
-        except:
-            pass  # Index already exists
+        
+        # Collections created before quantization was enabled
+        if info.config.quantization_config is None:
+            qdrant_client.update_collection(
+                collection_name=config.COLLECTION_NAME,
+                quantization_config=QUANTIZATION_CONFIG
+            )
+        
+        # Create (or upgrade a plain keyword) tenant index on thread_id
+        thread_index = info.payload_schema.get("thread_id")
+        if thread_index is None or not getattr(thread_index.params, "is_tenant", False):
+            try:
+                qdrant_client.create_payload_index(
+                    collection_name=config.COLLECTION_NAME,
+                    field_name="thread_id",
+                    field_schema=THREAD_ID_INDEX
+                )
+            except Exception as e:
+                print(f"⚠️ thread_id index error: {e}")
         
         try:
             qdrant_client.create_payload_index(
@@ -60,52 +169,208 @@ def setup_qdrant():
             pass
     except Exception as e:
         print(f"⚠️ Qdrant setup error: {e}")
+        if config.QDRANT_PREFER_GRPC:
+            print("⚠️ Qdrant gRPC port 6334 may be unreachable; set QDRANT_PREFER_GRPC=false to use REST")
 
 setup_qdrant()
 
 
 # ============ Memory Functions ============
+# LRU of text -> vector, shared by retrieval and the background writer so a
+# user message embedded for retrieval isn't embedded again when stored
+EMBEDDING_CACHE_SIZE = 4096
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+
+def _cache_get(text):
+    with _embedding_cache_lock:
+        vector = _embedding_cache.get(text)
+        if vector is not None:
+            _embedding_cache.move_to_end(text)
+        return vector
+
+
+def _cache_put(text, vector):
+    with _embedding_cache_lock:
+        _embedding_cache[text] = tuple(vector)
+        _embedding_cache.move_to_end(text)
+        if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+
+def cached_embed(text):
+    """Embed one text, reusing the vector if it was embedded recently"""
+    vector = _cache_get(text)
+    if vector is None:
+        vector = get_embedding_model().embed_query(text)
+        _cache_put(text, vector)
+    return list(vector)
+
+
+# Texts per embedding call; each call pads to its longest text
+EMBED_MICRO_BATCH = 16
+
+
+def _embed_by_length(texts):
+    """Embed longest-first in micro-batches so each batch holds similar lengths"""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    vectors = [None] * len(texts)
+    for start in range(0, len(order), EMBED_MICRO_BATCH):
+        chunk = order[start:start + EMBED_MICRO_BATCH]
+        batch = get_embedding_model().embed_documents([texts[i] for i in chunk])
+        for i, vector in zip(chunk, batch):
+            vectors[i] = vector
+    return vectors
+
+
+def cached_embed_many(texts):
+    """Embed several texts in one batch, skipping the ones already cached"""
+    vectors = [_cache_get(text) for text in texts]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        fresh = _embed_by_length([texts[i] for i in missing])
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+            _cache_put(texts[i], vector)
+    return [list(vector) for vector in vectors]
+
+
 def generate_point_id(thread_id, message_text, timestamp):
     """Create unique ID for memory"""
     unique_string = f"{thread_id}_{message_text[:50]}_{timestamp}"
-    return int(hashlib.md5(unique_string.encode()).hexdigest()[:16], 16) % (10**10)
+    # Qdrant accepts unsigned 64-bit ids, so the digest is used as-is
+    return xxhash.xxh64_intdigest(unique_string)
+
+
+# ============ Background Writer ============
+# Memory writes are queued and flushed by daemon threads so they never
+# block a chat turn. Writes arriving close together share one embedding
+# pass and one Qdrant upsert; uploads run on their own thread so the next
+# batch is embedded while the previous one is in flight.
+_write_queue = queue.Queue(maxsize=1024)
+_WRITE_BATCH_SIZE = 32
+_WRITE_WINDOW = 0.2  # seconds to wait for more writes before flushing
+# Embedded batches waiting for upload; small, so a slow Qdrant pushes back
+_upsert_queue = queue.Queue(maxsize=4)
+
+
+def _write_points(items):
+    """Embed and upsert queued (thread_id, text, role, timestamp) items"""
+    embeddings = cached_embed_many([text for _, text, _, _ in items])
+    points = [
+        PointStruct(
+            id=generate_point_id(thread_id, text, timestamp),
+            vector=embedding,
+            payload={
+                "thread_id": thread_id,
+                "text": text,
+                "role": role,
+                "timestamp": timestamp
+            }
+        )
+        for (thread_id, text, role, timestamp), embedding in zip(items, embeddings)
+    ]
+    # Hand off the upload so the writer can embed the next batch meanwhile
+    _upsert_queue.put(points)
+
+
+def _upsert_loop():
+    """Upload embedded batches in order, overlapping with the next embedding pass"""
+    while True:
+        points = _upsert_queue.get()
+        try:
+            # Nothing reads these back immediately, so don't wait for indexing
+            qdrant_client.upsert(
+                collection_name=config.COLLECTION_NAME,
+                points=points,
+                wait=False
+            )
+        except Exception as e:
+            print(f"⚠️ Error storing memory: {e}")
+        finally:
+            _upsert_queue.task_done()
+
+
+def _writer_loop():
+    """Drain the write queue, coalescing writes that arrive within the window"""
+    while True:
+        items = [_write_queue.get()]
+        deadline = time.monotonic() + _WRITE_WINDOW
+        while len(items) < _WRITE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(_write_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            _write_points(items)
+        except Exception as e:
+            print(f"⚠️ Error storing memory: {e}")
+        finally:
+            for _ in items:
+                _write_queue.task_done()
+
+threading.Thread(target=_writer_loop, daemon=True).start()
+threading.Thread(target=_upsert_loop, daemon=True).start()
+
+
+def _flush_writes(timeout=10):
+    """Give queued writes a chance to land before the process exits"""
+    deadline = time.monotonic() + timeout
+    while (
+        (_write_queue.unfinished_tasks or _upsert_queue.unfinished_tasks)
+        and time.monotonic() < deadline
+    ):
+        time.sleep(0.05)
+
+atexit.register(_flush_writes)
+
+
+def _enqueue(thread_id, messages):
+    """Queue (text, role) pairs for the background writer"""
+    timestamp = time.time()
+    for i, (message_text, role) in enumerate(messages):
+        # Offset timestamps slightly so messages keep their order
+        item = (str(thread_id), message_text, role, timestamp + i * 1e-6)
+        try:
+            # Never block: callers include the graph's shared event loop
+            _write_queue.put_nowait(item)
+        except queue.Full:
+            print("⚠️ Memory write queue full, dropping message")
 
 
 def store_memory(thread_id, message_text, role):
     """
-    Save message to memory
+    Save message to memory (queued, returns immediately)
     
     Args:
         thread_id: conversation ID
         message_text: the message
         role: "user" or "assistant" or "system"
     """
-    try:
-        # Convert text to vector
-        embedding = embedding_model.embed_query(message_text)
-        timestamp = time.time()
-        point_id = generate_point_id(str(thread_id), message_text, timestamp)
-        
-        # Create point
-        point = PointStruct(
-            id=point_id,
-            vector=embedding,
-            payload={
-                "thread_id": str(thread_id),
-                "text": message_text,
-                "role": role,
-                "timestamp": timestamp
-            }
-        )
-        
-        # Save to Qdrant
-        qdrant_client.upsert(
-            collection_name=config.COLLECTION_NAME,
-            points=[point]
-        )
-        
-    except Exception as e:
-        print(f"⚠️ Error storing memory: {e}")
+    _enqueue(thread_id, [(message_text, role)])
+
+
+def store_memory_batch(thread_id, messages):
+    """
+    Save several messages together (queued, returns immediately)
+
+    Args:
+        thread_id: conversation ID
+        messages: list of (message_text, role) tuples, in conversation order
+    """
+    _enqueue(thread_id, messages)
+
+
+def _thread_filter(thread_id):
+    """Typed filter on thread_id, so Qdrant can use the payload index"""
+    return Filter(must=[
+        FieldCondition(key="thread_id", match=MatchValue(value=str(thread_id)))
+    ])
 
 
 def retrieve_memory(thread_id, query, limit=5):
@@ -122,17 +387,18 @@ def retrieve_memory(thread_id, query, limit=5):
     """
     try:
         # Convert query to vector
-        query_vector = embedding_model.embed_query(query)
+        query_vector = cached_embed(query)
         
         # Search Qdrant
-        results = qdrant_client.search(
+        results = (qdrant_client.query_points(
             collection_name=config.COLLECTION_NAME,
-            query_vector=query_vector,
+            query=query_vector,
+            query_filter=_thread_filter(thread_id),
             limit=limit,
-            query_filter={
-                "must": [{"key": "thread_id", "match": {"value": str(thread_id)}}]
-            }
-        )
+            search_params=SEARCH_PARAMS,
+            with_payload=["text"],
+            with_vectors=False
+        )).points
         
         # Return text only
         return [r.payload.get("text", "") for r in results if r.payload.get("text")]
@@ -142,30 +408,128 @@ def retrieve_memory(thread_id, query, limit=5):
         return []
 
 
+async def aretrieve_memory(thread_id, query, limit=5):
+    """Async version of retrieve_memory, used inside the graph"""
+    try:
+        # Embedding is CPU-bound, keep it off the event loop
+        query_vector = await asyncio.to_thread(cached_embed, query)
+        
+        results = (await async_qdrant_client.query_points(
+            collection_name=config.COLLECTION_NAME,
+            query=query_vector,
+            query_filter=_thread_filter(thread_id),
+            limit=limit,
+            search_params=SEARCH_PARAMS,
+            with_payload=["text"],
+            with_vectors=False
+        )).points
+        
+        return [r.payload.get("text", "") for r in results if r.payload.get("text")]
+        
+    except Exception as e:
+        print(f"⚠️ Error retrieving memory: {e}")
+        return []
+
+
 # ============ SQLite Checkpointer ============
-# Create database connection
-conn = sqlite3.connect(config.DB_PATH, check_same_thread=False)
-checkpointer = SqliteSaver(conn=conn)
+# Background event loop that owns the async checkpointer and runs graph streams
+event_loop = asyncio.new_event_loop()
+threading.Thread(target=event_loop.run_forever, daemon=True).start()
+
+
+# WAL lets reads run alongside checkpoint writes, synchronous=NORMAL only
+# fsyncs at WAL checkpoints, and mmap/cache_size keep hot pages in memory
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+)
+
+
+async def _open_checkpointer():
+    """Create the database connection and checkpointer on the event loop"""
+    aconn = await aiosqlite.connect(config.DB_PATH)
+    for pragma in SQLITE_PRAGMAS:
+        await aconn.execute(f"PRAGMA {pragma}")
+    saver = AsyncSqliteSaver(conn=aconn)
+    await saver.setup()  # create the checkpoint tables before we query them
+    return aconn, saver
+
+conn, checkpointer = asyncio.run_coroutine_threadsafe(_open_checkpointer(), event_loop).result()
 
 # Close connection when program exits
 def cleanup():
-    conn.close()
+    asyncio.run_coroutine_threadsafe(conn.close(), event_loop).result(timeout=5)
     print("🔒 Database closed")
 
 atexit.register(cleanup)
 
 
+async def _aexecute(sql, params=(), commit=False):
+    # Share the checkpointer's lock so our commits never land mid-checkpoint
+    async with checkpointer.lock:
+        async with conn.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        if commit:
+            await conn.commit()
+    return rows
+
+
+def run_sql(sql, params=(), commit=False):
+    """Run a statement on the shared database connection (not from event_loop itself)"""
+    return asyncio.run_coroutine_threadsafe(
+        _aexecute(sql, params, commit), event_loop
+    ).result()
+
+
+# Generated titles never change, so keep them locally instead of asking Qdrant
+run_sql(
+    "CREATE TABLE IF NOT EXISTS titles (thread_id TEXT PRIMARY KEY, title TEXT, ts REAL)",
+    commit=True
+)
+
+
+def _cached_title(thread_id):
+    rows = run_sql("SELECT title FROM titles WHERE thread_id = ?", (thread_id,))
+    return rows[0][0] if rows else None
+
+
+def _save_title(thread_id, title):
+    run_sql(
+        "INSERT OR REPLACE INTO titles VALUES (?, ?, ?)",
+        (thread_id, title, time.time()),
+        commit=True
+    )
+
+
+# Short-lived cache shared across callers. The app reads the thread list once
+# per session, so this only saves the query when several sessions start
+# within a few seconds of each other
+THREADS_CACHE_TTL = 5  # seconds
+_threads_cache = {"t": 0.0, "v": []}
+
+
 def get_all_threads():
-    """Get list of all conversation IDs"""
-    threads = set()
+    """Get list of all conversation IDs, least recently active first"""
+    now = time.monotonic()
+    if now - _threads_cache["t"] < THREADS_CACHE_TTL:
+        return list(_threads_cache["v"])
+    
     try:
-        for checkpoint in checkpointer.list(None):
-            t = checkpoint.config.get("configurable", {}).get("thread_id")
-            if t:
-                threads.add(t)
+        # Reads only the checkpoints primary key (thread_id, checkpoint_ns,
+        # checkpoint_id); checkpoint ids are time-ordered
+        rows = run_sql(
+            "SELECT thread_id FROM checkpoints "
+            "GROUP BY thread_id ORDER BY MAX(checkpoint_id)"
+        )
+        threads = [row[0] for row in rows]
     except Exception as e:
         print(f"⚠️ Error getting threads: {e}")
+        return []
     
+    _threads_cache.update(t=now, v=threads)
     return list(threads)
 
 
@@ -194,6 +558,7 @@ Title:"""
         
         # Store in memory as a system role message
         store_memory(thread_id, f"TITLE:{title}", "system")
+        _save_title(str(thread_id), title)
         return title
         
     except Exception as e:
@@ -206,41 +571,46 @@ def get_conversation_title(thread_id):
     thread_id_str = str(thread_id)
     
     try:
-        results, _ = qdrant_client.scroll(
-            collection_name=config.COLLECTION_NAME,
-            scroll_filter={
-                "must": [
-                    {"key": "thread_id", "match": {"value": thread_id_str}},
-                    {"key": "role", "match": {"value": "system"}}
-                ]
-            },
-            limit=10,
-            with_payload=["text"]
-        )
-        
-        for point in results:
-            if point.payload.get("text", "").startswith("TITLE:"):
-                return point.payload.get("text")[6:]
+        title = _cached_title(thread_id_str)
+        if title:
+            return title
         
-        results, _ = qdrant_client.scroll(
-            collection_name=config.COLLECTION_NAME,
-            scroll_filter={
-                "must": [
-                    {"key": "thread_id", "match": {"value": thread_id_str}},
-                    {"key": "role", "match": {"value": "user"}}
-                ]
-            },
-            limit=100,
-            with_payload=["text", "timestamp"]
-        )
+        # Scroll the thread's system + user messages until a stored TITLE point
+        # turns up. Without one, paging runs to the end of the thread to find
+        # the earliest user message, i.e. ceil(N/200) scrolls for N messages
+        scroll_filter = Filter(must=[
+            FieldCondition(key="thread_id", match=MatchValue(value=thread_id_str)),
+            FieldCondition(key="role", match=MatchAny(any=["system", "user"]))
+        ])
+        first_user = None
+        offset = None
         
-        if results:
-            sorted_results = sorted(results, key=lambda x: x.payload.get("timestamp", 0))
-            first_user_message = sorted_results[0].payload.get("text", "")
+        while True:
+            results, offset = qdrant_client.scroll(
+                collection_name=config.COLLECTION_NAME,
+                scroll_filter=scroll_filter,
+                limit=200,
+                offset=offset,
+                with_payload=["text", "role", "timestamp"],
+                with_vectors=False
+            )
             
-            if first_user_message:
-                title = generate_conversation_title(thread_id, first_user_message)
-                return title
+            for point in results:
+                text = point.payload.get("text", "")
+                role = point.payload.get("role")
+                if role == "system" and text.startswith("TITLE:"):
+                    _save_title(thread_id_str, text[6:])
+                    return text[6:]
+                if role == "user" and text:
+                    timestamp = point.payload.get("timestamp", 0)
+                    if first_user is None or timestamp < first_user[0]:
+                        first_user = (timestamp, text)
+            
+            if offset is None:
+                break
+        
+        if first_user:
+            return generate_conversation_title(thread_id, first_user[1])
         
         return f"Chat {thread_id_str[:8]}"
         
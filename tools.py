@@ -2,37 +2,81 @@
 All AI tools in one file
 """
 import re
-import requests
+import asyncio
+import operator
+import atexit
+import aiohttp
+from aiohttp_retry import RetryClient, ExponentialRetry
 from langchain_core.tools import tool
 from langchain_community.tools import DuckDuckGoSearchRun
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
-import wikipedia
 import config
 
 
+# ============ Shared HTTP Session ============
+# One keep-alive connection pool for all async tools, created lazily because
+# an aiohttp session must be bound to the event loop that uses it
+_session = None
+_session_loop = None
+_client = None
+
+# Retry transient failures (rate limits, gateway errors, dropped connections)
+# with exponential backoff starting at 0.2s
+_RETRY_OPTIONS = ExponentialRetry(
+    attempts=3,
+    start_timeout=0.2,
+    statuses={429, 502, 503, 504},
+    # Only the statuses above; the default also retries every other 5xx
+    retry_all_server_errors=False,
+    exceptions={aiohttp.ClientConnectionError}
+)
+
+
+def _get_session():
+    """Return the shared, retrying HTTP client for the running event loop"""
+    global _session, _session_loop, _client
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+        _client = RetryClient(client_session=_session, retry_options=_RETRY_OPTIONS)
+        _session_loop = loop
+    return _client
+
+
+def _close_session():
+    if _session is not None and not _session.closed and _session_loop.is_running():
+        asyncio.run_coroutine_threadsafe(_session.close(), _session_loop).result(timeout=5)
+
+atexit.register(_close_session)
+
+
 # ============ Tool 1: Web Search ============
 search_tool = DuckDuckGoSearchRun(region="us-en")
 
 
 # ============ Tool 2: Calculator ============
+_OPS = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+}
+
+
 @tool
 def calculator(first_num: float, second_num: float, operation: str) -> dict:
     """
     Do basic math: add, sub, mul, div
     """
     try:
-        if operation == "add":
-            result = first_num + second_num
-        elif operation == "sub":
-            result = first_num - second_num
-        elif operation == "mul":
-            result = first_num * second_num
-        elif operation == "div":
-            if second_num == 0:
-                return {"error": "Cannot divide by zero"}
-            result = first_num / second_num
-        else:
+        op = _OPS.get(operation)
+        if op is None:
             return {"error": "Use: add, sub, mul, or div"}
+        if operation == "div" and second_num == 0:
+            return {"error": "Cannot divide by zero"}
+        result = op(first_num, second_num)
         
         return {
             "first_num": first_num,
@@ -45,14 +89,20 @@ def calculator(first_num: float, second_num: float, operation: str) -> dict:
 
 
 # ============ Tool 3: YouTube Transcript ============
+_YT_ID_RE = re.compile(r"(?:v=|youtu\.be/)([A-Za-z0-9_-]{11})")
+
+
 @tool
 def get_transcript(video_url: str) -> dict:
     """
     Get YouTube video transcript
     """
+    # Imported here so the library only loads if the tool is actually used
+    from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
+    
     try:
         # Get video ID from URL
-        match = re.search(r"(?:v=|youtu\.be/)([A-Za-z0-9_-]{11})", video_url)
+        match = _YT_ID_RE.search(video_url)
         video_id = match.group(1) if match else video_url
         
         # Get transcript
@@ -70,7 +120,7 @@ def get_transcript(video_url: str) -> dict:
 
 # ============ Tool 4: Stock Price ============
 @tool
-def get_stock_price(symbol: str) -> dict:
+async def get_stock_price(symbol: str) -> dict:
     """
     Get stock price from AlphaVantage
     """
@@ -82,14 +132,20 @@ def get_stock_price(symbol: str) -> dict:
             f"&interval=5min"
             f"&apikey={config.STOCK_API_KEY}"
         )
-        return requests.get(url).json()
+        async with _get_session().get(url) as response:
+            return await response.json(content_type=None)
     except Exception as e:
         return {"error": str(e)}
 
 
 # ============ Tool 5: Wikipedia Search ============
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+# Wikimedia asks API clients to identify themselves
+WIKIPEDIA_HEADERS = {"User-Agent": "Smart-AI-Assistant/1.0 (LangGraph chatbot)"}
+
+
 @tool
-def search_wikipedia(query: str, sentences: int = 3) -> dict:
+async def search_wikipedia(query: str, sentences: int = 3) -> dict:
     """
     Search Wikipedia and get a summary.
     
@@ -101,41 +157,62 @@ def search_wikipedia(query: str, sentences: int = 3) -> dict:
         Dictionary with title, summary, and url
     """
     try:
-        # Search for the page
-        search_results = wikipedia.search(query, results=1)
+        # A single request searches and returns the intro extract, URL,
+        # categories and disambiguation flag for the top hits
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "redirects": "1",
+            "generator": "search",
+            "gsrsearch": query,
+            "gsrlimit": "5",
+            "prop": "extracts|info|categories|pageprops",
+            "exintro": "1",
+            "explaintext": "1",
+            "exsentences": str(sentences),
+            "exlimit": "5",
+            "inprop": "url",
+            "cllimit": "max",
+            "clshow": "!hidden",
+            "ppprop": "disambiguation",
+        }
+        async with _get_session().get(
+            WIKIPEDIA_API_URL, params=params, headers=WIKIPEDIA_HEADERS
+        ) as response:
+            data = await response.json()
         
-        if not search_results:
+        # Pages come back unordered; "index" is the search rank
+        pages = sorted(data.get("query", {}).get("pages", []), key=lambda p: p.get("index", 0))
+        
+        if not pages:
             return {"error": f"No Wikipedia article found for '{query}'"}
         
-        # Get the page
-        page = wikipedia.page(search_results[0], auto_suggest=False)
+        page = pages[0]
         
-        # Get summary with specified sentences
-        summary = wikipedia.summary(search_results[0], sentences=sentences, auto_suggest=False)
+        if "disambiguation" in page.get("pageprops", {}):
+            # Multiple results found
+            return {
+                "error": "Multiple results found. Please be more specific.",
+                "options": [p["title"] for p in pages[1:]]
+            }
         
-        return {
-            "title": page.title,
-            "summary": summary,
-            "url": page.url,
-            "categories": page.categories[:5] if hasattr(page, 'categories') else []
-        }
+        categories = [c["title"].split(":", 1)[-1] for c in page.get("categories", [])]
         
-    except wikipedia.exceptions.DisambiguationError as e:
-        # Multiple results found
-        options = e.options[:5]  # Show first 5 options
         return {
-            "error": "Multiple results found. Please be more specific.",
-            "options": options
+            "title": page["title"],
+            "summary": page.get("extract", ""),
+            "url": page.get("fullurl"),
+            "categories": categories[:5]
         }
-    except wikipedia.exceptions.PageError:
-        return {"error": f"No Wikipedia page found for '{query}'"}
+        
     except Exception as e:
         return {"error": f"Wikipedia error: {str(e)}"}
 
 
 # ============ Tool 6: Weather (wttr.in) ============
 @tool
-def get_weather(city: str) -> str:
+async def get_weather(city: str) -> str:
     """
     Get current weather for any city using wttr.in service.
     
@@ -154,23 +231,25 @@ def get_weather(city: str) -> str:
         # wttr.in API - simple and free, no API key needed
         # %C = weather condition, %t = temperature
         url = f"https://wttr.in/{city.lower()}?format=%C+%t"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            weather_text = response.text.strip()
-            return f"The weather in {city} is {weather_text}"
-        else:
-            return f"⚠️ Could not fetch weather for {city}. Please check the city name."
+        async with _get_session().get(url) as response:
+            if response.status == 200:
+                weather_text = (await response.text()).strip()
+                return f"The weather in {city} is {weather_text}"
+            else:
+                return f"⚠️ Could not fetch weather for {city}. Please check the city name."
             
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         return f"⚠️ Weather service timeout for {city}. Please try again."
     except Exception as e:
         return f"⚠️ Error getting weather for {city}: {str(e)}"
 
 
 # ============ Tool 7: Language Translation ============
+TRANSLATE_URL = "https://translate.googleapis.com/translate_a/single"
+
+
 @tool
-def translate_text(text: str, target_language: str = "en", source_language: str = "auto") -> dict:
+async def translate_text(text: str, target_language: str = "en", source_language: str = "auto") -> dict:
     """
     Translate text between languages using Google Translate.
     
@@ -194,10 +273,23 @@ def translate_text(text: str, target_language: str = "en", source_language: str
         - "Convert 'Bonjour' to English"
     """
     try:
-        from googletrans import Translator
+        # One request to the public endpoint: dt=t returns the translation,
+        # dt=rm the romanization, and data[2] the detected source language
+        params = [
+            ("client", "gtx"),
+            ("sl", source_language),
+            ("tl", target_language),
+            ("dt", "t"),
+            ("dt", "rm"),
+            ("q", text),
+        ]
+        async with _get_session().get(TRANSLATE_URL, params=params) as response:
+            data = await response.json(content_type=None)
         
-        translator = Translator()
-        result = translator.translate(text, dest=target_language, src=source_language)
+        segments = data[0] or []
+        translated = "".join(seg[0] for seg in segments if seg[0])
+        romanized = [seg[2] for seg in segments if not seg[0] and len(seg) > 2 and seg[2]]
+        detected_src = data[2] if len(data) > 2 and data[2] else source_language
         
         # Language name mapping for better UX
         lang_names = {
@@ -207,21 +299,17 @@ def translate_text(text: str, target_language: str = "en", source_language: str
             'tr': 'Turkish', 'ru': 'Russian', 'it': 'Italian'
         }
         
-        source_name = lang_names.get(result.src, result.src)
+        source_name = lang_names.get(detected_src, detected_src)
         target_name = lang_names.get(target_language, target_language)
         
         return {
             "original_text": text,
-            "translated_text": result.text,
-            "source_language": f"{source_name} ({result.src})",
+            "translated_text": translated,
+            "source_language": f"{source_name} ({detected_src})",
             "target_language": f"{target_name} ({target_language})",
-            "pronunciation": result.pronunciation if result.pronunciation else None
+            "pronunciation": romanized[0] if romanized else None
         }
         
-    except ImportError:
-        return {
-            "error": "Translation library not installed. Run: pip install googletrans==4.0.0-rc1"
-        }
     except Exception as e:
         return {"error": f"Translation failed: {str(e)}"}
 